@@ -21,6 +21,11 @@ EXTRAS_REQUIRE = {
     "pc": [  # Optional dependency for pc
         "planetary-computer",
         "odc-stac",
+        "pyarrow",
+    ],
+    "batch": [  # Optional dependencies for storing cubes with terragon batch
+        "netCDF4",
+        "zarr",
     ],
 }
 
@@ -39,6 +44,7 @@ setup(
     packages=["terragon"],
     install_requires=INSTALL_REQUIRES,
     extras_require=EXTRAS_REQUIRE,
+    entry_points={"console_scripts": ["terragon=terragon.cli:main"]},
     python_requires=">=3.9",
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -105,8 +105,11 @@ class Base(ABC):
         clip_to_shp: bool = True,
         download_folder: str = None,
         num_workers: int = 1,
+        min_usable_fraction: float = None,
     ):
-        """Take all arguments and store them."""
+        """Take all arguments and store them.
+        If min_usable_fraction is set, only scenes with at least this fraction of usable
+        (cloud free) pixels within shp are downloaded, based on the cloud mask of the collection."""
         # create a union of a dataframe of more than one shape in shp
         if len(shp.index) > 1:
             shp = gpd.GeoDataFrame(geometry=[shp.unary_union], crs=shp.crs)
@@ -124,6 +127,7 @@ class Base(ABC):
                 "clip_to_shp": clip_to_shp,
                 "download_folder": download_folder,
                 "num_workers": num_workers,
+                "min_usable_fraction": min_usable_fraction,
             }
         )
 
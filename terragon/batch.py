@@ -0,0 +1,158 @@
+import importlib.util
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import geopandas as gpd
+
+from .init import init
+
+logger = logging.getLogger(__name__)
+
+# backend instance of the worker process, created once by the pool initializer
+_backend = None
+
+
+def _init_worker(api, credentials):
+    global _backend
+    _backend = init(api, credentials)
+
+
+def _create_cube(cube_id, shp, parameters, fn, file_format):
+    """Create one minicube in a worker process and write it to fn."""
+    start = time.time()
+    ds = _backend.create(shp=shp, **parameters)
+    if file_format == "zarr":
+        ds.to_zarr(fn, mode="w")
+    else:
+        ds.to_netcdf(fn)
+    return cube_id, _store_size(fn), time.time() - start
+
+
+def _store_size(fn):
+    """Return the bytes written to a file or a store directory (zarr)."""
+    if fn.is_dir():
+        return sum(f.stat().st_size for f in fn.rglob("*") if f.is_file())
+    return fn.stat().st_size
+
+
+# packages of which at least one is needed to write the format
+_FORMAT_PACKAGES = {
+    "nc": ["netCDF4", "h5netcdf", "scipy"],
+    "zarr": ["zarr"],
+}
+
+
+def read_ledger(fn):
+    """Return the ids of the cubes which are completed according to the ledger."""
+    done = set()
+    if fn.exists():
+        with open(fn) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry["status"] == "done":
+                        done.add(entry["id"])
+    return done
+
+
+def run_batch(manifest, output=None, workers=None, file_format="nc"):
+    """Create a minicube for every polygon of a manifest within a process pool.
+
+    The manifest is a json file (or dict) with the keys:
+        api: name of the backend, e.g. "pc" or "gee"
+        credentials: credentials of the backend (optional)
+        polygons: file with the polygons readable by geopandas
+        id_column: column of the polygons used to name the cubes (optional, default index)
+        parameters: arguments of create, except shp
+        output: folder to store the cubes and the ledger (optional, default eo_cubes)
+
+    Relative paths in the manifest are resolved against the folder of the manifest file,
+    the output argument overrides the output of the manifest.
+    Completed cubes are recorded in ledger.jsonl in the output folder, rerunning
+    the same manifest skips them and resumes where a previous run stopped."""
+    root = Path(".")
+    if not isinstance(manifest, dict):
+        root = Path(manifest).parent
+        with open(manifest) as f:
+            manifest = json.load(f)
+    if file_format not in _FORMAT_PACKAGES:
+        raise ValueError(f'Format {file_format} not supported. Please use "nc" or "zarr".')
+    # fail once at the start instead of for every cube in the pool
+    if not any(importlib.util.find_spec(p) for p in _FORMAT_PACKAGES[file_format]):
+        raise ImportError(
+            f"Writing {file_format} requires one of {_FORMAT_PACKAGES[file_format]}. "
+            "Install it with: pip install terragon-downloader[batch]"
+        )
+
+    output = Path(output) if output else root.joinpath(manifest.get("output", "eo_cubes"))
+    polygons = gpd.read_file(root.joinpath(manifest["polygons"]))
+    id_column = manifest.get("id_column")
+    ids = polygons[id_column] if id_column else polygons.index
+    duplicates = ids[ids.astype(str).duplicated()]
+    if len(duplicates) > 0:
+        raise ValueError(
+            f"Ids of the polygons must be unique, duplicates: {list(duplicates.unique())}."
+        )
+    output.mkdir(parents=True, exist_ok=True)
+    parameters = manifest.get("parameters", {})
+
+    ledger = output.joinpath("ledger.jsonl")
+    done = read_ledger(ledger)
+    todo = [
+        (str(cube_id), polygons.iloc[[i]])
+        for i, cube_id in enumerate(ids)
+        if str(cube_id) not in done
+    ]
+    logger.info(f"{len(done)} cubes already completed, creating {len(todo)} cubes.")
+    if len(todo) == 0:
+        return done
+
+    workers = workers or os.cpu_count()
+    start, nr_done, nr_bytes = time.time(), 0, 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initargs=(manifest["api"], manifest.get("credentials")),
+        initializer=_init_worker,
+    ) as pool, open(ledger, "a") as f:
+        futures = {
+            pool.submit(
+                _create_cube,
+                cube_id,
+                shp,
+                parameters,
+                output.joinpath(f"{cube_id}.{file_format}"),
+                file_format,
+            ): cube_id
+            for cube_id, shp in todo
+        }
+        for future in as_completed(futures):
+            cube_id = futures[future]
+            try:
+                _, size, seconds = future.result()
+            except Exception as e:
+                entry = {"id": cube_id, "status": "failed", "error": str(e)}
+                logger.warning(f"Failed to create cube {cube_id}: {e}")
+            else:
+                entry = {
+                    "id": cube_id,
+                    "status": "done",
+                    "file": f"{cube_id}.{file_format}",
+                    "bytes": size,
+                    "seconds": seconds,
+                }
+                done.add(cube_id)
+                nr_done += 1
+                nr_bytes += size
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+
+            elapsed = time.time() - start
+            logger.info(
+                f"{nr_done}/{len(todo)} cubes, {nr_done / elapsed * 60:.2f} cubes/min, "
+                f"{nr_bytes / 1e6 / elapsed:.2f} MB/s"
+            )
+    return done
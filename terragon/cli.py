@@ -0,0 +1,33 @@
+import argparse
+import logging
+
+from .batch import run_batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="terragon",
+        description="Create EO Minicubes from Polygons and simplify EO Data downloading.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser(
+        "batch", help="Create minicubes for all polygons of a manifest."
+    )
+    batch.add_argument("manifest", help="json manifest with the polygons and parameters")
+    batch.add_argument("-o", "--output", help="folder to store the cubes and the ledger")
+    batch.add_argument(
+        "-w", "--workers", type=int, help="number of processes (default: all cores)"
+    )
+    batch.add_argument(
+        "-f", "--format", default="nc", choices=["nc", "zarr"], help="storage format"
+    )
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "batch":
+        run_batch(args.manifest, args.output, args.workers, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,27 @@ import warnings
 import ee
 import geedim
 import pandas as pd
+import pyproj
 import rioxarray as rxr
 import xarray as xr
 from joblib import Parallel, delayed
 
 from .base import Base
-from .utils import meters_to_crs_unit, rm_files
+from .utils import grid_coords, grid_warp_index, rm_files, shp_to_grid
 
 
 class GEE(Base):
+    # cloud mask band and its usable classes per collection
+    _cloud_masks = {
+        # SCL: vegetation, not vegetated, water, unclassified, snow
+        "COPERNICUS/S2_SR": ("SCL", [4, 5, 6, 7, 11]),
+        "COPERNICUS/S2_SR_HARMONIZED": ("SCL", [4, 5, 6, 7, 11]),
+    }
+
     def __init__(self, credentials: dict = None):
         super().__init__()
+        if credentials:
+            ee.Initialize(**credentials)
         if not ee.data._credentials:
             raise RuntimeError(
                 "GEE not initialized. Did you run 'ee.Authenticate()' and ee.Initialize(project='my-project')?"
@@ -39,12 +49,57 @@ class GEE(Base):
             img_col = img_col.filterDate(start_date)
         elif end_date:
             raise ValueError("In GEE end_date must be used with start_date.")
+        if self.param("min_usable_fraction") is not None:
+            img_col = self._filter_usable(img_col)
         bands = self.param("bands")
         if bands:
             img_col = img_col.select(bands)
 
         return img_col
 
+    def _filter_usable(self, img_col):
+        """Compute the usable fraction of the cloud mask over the shape and keep the images above the threshold.
+        This is evaluated on the server, so that only the bands of the remaining images are downloaded.
+        Images of the same acquisition date are mosaicked, so that adjacent tiles are evaluated together."""
+        collection = self.param("collection")
+        if collection not in self._cloud_masks:
+            raise ValueError(
+                f"No cloud mask available for collection {collection}. "
+                f"Supported are: {list(self._cloud_masks)}."
+            )
+        band, classes = self._cloud_masks[collection]
+        shp_4326 = self._reproject_shp(self.param("shp"))
+        region = ee.FeatureCollection(json.loads(shp_4326["geometry"].to_json()))
+
+        img_col = img_col.filterBounds(region).map(
+            lambda img: img.set("date", img.date().format("YYYY-MM-dd"))
+        )
+        # the mosaic has no projection, use the native scale of the cloud mask
+        scale = img_col.first().select(band).projection().nominalScale()
+
+        def usable_fraction(date):
+            mosaic = img_col.filter(ee.Filter.eq("date", date)).select(band).mosaic()
+            # pixels not covered by any image count as unusable
+            usable = (
+                mosaic.remap(classes, [1] * len(classes), 0)
+                .unmask(0, False)
+                .rename("usable")
+            )
+            fraction = usable.reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=region.geometry(),
+                scale=scale,
+                maxPixels=1e13,
+            ).get("usable")
+            return ee.Feature(None, {"date": date, "usable_fraction": fraction})
+
+        dates = img_col.aggregate_array("date").distinct()
+        fractions = ee.FeatureCollection(dates.map(usable_fraction))
+        usable_dates = fractions.filter(
+            ee.Filter.gte("usable_fraction", self.param("min_usable_fraction"))
+        ).aggregate_array("date")
+        return img_col.filter(ee.Filter.inList("date", usable_dates))
+
     def download(self, img_col, create_minicube=True, remove_tmp=True):
         shp_4326 = self._reproject_shp(self.param("shp"))
 
@@ -76,9 +131,11 @@ class GEE(Base):
                 Setting it to 40 for downloading, see https://developers.google.com/earth-engine/guides/usage."
             )
             num_workers = 40
+        # export all images on the target grid of the cube
+        transform, shape = shp_to_grid(self.param("shp"), self.param("resolution"))
         fns = Parallel(n_jobs=num_workers, backend="threading")(
             delayed(self.download_img)(
-                img_col, i, tmp_dir, self.param("shp"), self.param("resolution")
+                img_col, i, tmp_dir, self.param("shp"), transform, shape
             )
             for i in range(col_size)
         )
@@ -93,7 +150,7 @@ class GEE(Base):
         ds = self.prepare_cube(ds)
         return ds
 
-    def download_img(self, img_col, i, tmp_dir, shp, resolution):
+    def download_img(self, img_col, i, tmp_dir, shp, transform, shape):
         img = ee.Image(img_col.get(i))
         # get the system id
         id_prop = next(
@@ -119,8 +176,8 @@ class GEE(Base):
             img.download(
                 fileName,
                 crs=f"EPSG:{shp.crs.to_epsg()}",
-                scale=resolution,
-                region=self._region.geometry(),
+                crs_transform=list(transform)[:6],
+                shape=shape,
             )
         return fileName
 
@@ -130,22 +187,70 @@ class GEE(Base):
             raise ValueError("No files provided to merge.")
         date_pattern = r"\d{8}"
         shp = self.param("shp")
-        resolution = self.param("resolution")
 
-        def load_tif(fn):
-            da = rxr.open_rasterio(fn)
-            if da.rio.crs != shp.crs:
-                res = meters_to_crs_unit(resolution, shp)
-                da = da.rio.reproject(shp.crs, resolution=res)
+        # one target grid for all files, so that they align without a join
+        transform, shape = shp_to_grid(shp, self.param("resolution"))
+        x, y = grid_coords(transform, shape)
+
+        def grid_key(da):
+            # normalize the crs through pyproj, so that equal source grids share a key
+            return (
+                pyproj.CRS.from_user_input(da.rio.crs).to_wkt(),
+                da.rio.transform(),
+                da.rio.shape,
+            )
+
+        # read only the source grids, warp parameters are shared between equal grids
+        keys = []
+        for fn in fns:
+            with rxr.open_rasterio(fn) as da:
+                keys.append(grid_key(da))
+        warp_cache = {}
+        for key in keys:
+            if key not in warp_cache:
+                src_crs, src_transform, src_shape = key
+                if (
+                    pyproj.CRS.from_wkt(src_crs) == shp.crs
+                    and src_transform.almost_equals(transform, abs(transform.a) * 1e-6)
+                    and src_shape == shape
+                ):  # already on the target grid
+                    warp_cache[key] = None
+                else:
+                    warp_cache[key] = grid_warp_index(
+                        src_crs, src_transform, src_shape, shp.crs, transform, shape
+                    )
+
+        def load_tif(fn, key):
+            with rxr.open_rasterio(fn) as da:
+                data = da.values
+                nodata = da.rio.nodata
+                band = da.band.values
+                attrs = dict(da.attrs)
+            if warp_cache[key] is not None:
+                rows, cols, valid = warp_cache[key]
+                data = data[:, rows, cols]
+                if nodata is None:
+                    data = data.astype("float32")
+                    nodata = float("nan")
+                data[:, ~valid] = nodata
+            out = xr.DataArray(
+                data,
+                coords={"band": band, "y": y, "x": x},
+                dims=("band", "y", "x"),
+                attrs=attrs,
+            )
+            out = out.rio.write_crs(shp.crs).rio.write_transform(transform)
+            if nodata is not None:
+                out = out.rio.write_nodata(nodata, encoded=False)
             time_str = re.findall(date_pattern, str(fn))[0]
-            da = da.assign_coords(time=pd.to_datetime(time_str, format="%Y%m%d"))
-            return da
+            out = out.assign_coords(time=pd.to_datetime(time_str, format="%Y%m%d"))
+            return out
 
-        out = Parallel(n_jobs=self.get_param("num_workers"))(
-            delayed(load_tif)(fn) for fn in fns
+        out = Parallel(n_jobs=self.get_param("num_workers"), backend="threading")(
+            delayed(load_tif)(fn, key) for fn, key in zip(fns, keys)
         )
 
-        ds = xr.concat(out, dim="time").compute()
+        ds = xr.concat(out, dim="time", join="exact")
         ds = ds.sortby("time")
         ds = ds.to_dataset(dim="band")
         ds = ds.rename_vars(
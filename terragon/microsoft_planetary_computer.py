@@ -1,25 +1,47 @@
+import json
+import operator
+import warnings
+from pathlib import Path
 from urllib.parse import urljoin
 
+import geopandas as gpd
 import odc.stac
+import pandas as pd
 import planetary_computer as pc
+import pystac
+import pyarrow.parquet as pq
 import pystac_client
 import requests
+from geopandas.io.arrow import _geopandas_to_arrow
 from joblib import Parallel, delayed
+from rasterio.features import geometry_mask
+from shapely.geometry import box, shape
 
 from .base import Base
 from .utils import meters_to_crs_unit
 
 
 class PC(Base):
+    # cloud mask band and its usable classes per collection
+    _cloud_masks = {
+        # SCL: vegetation, not vegetated, water, unclassified, snow
+        "sentinel-2-l2a": ("SCL", [4, 5, 6, 7, 11]),
+    }
+
     def __init__(
         self,
         credentials: dict = None,
         base_url: str = "https://planetarycomputer.microsoft.com/api/stac/v1/",
+        index_file: str = None,
     ):
         super().__init__()
         self.base_url = base_url
         if credentials:
             pc.set_subscription_key(credentials["api_key"])
+        self._index = None
+        self._index_extent = None
+        if index_file:
+            self.load_index(index_file)
 
     def retrieve_collections(self, filter_by_name: str = None):
         collections_url = urljoin(self.base_url, "collections")
@@ -42,24 +64,129 @@ class PC(Base):
         super().search(**kwargs)
         bounds_4326 = self._reproject_shp(self.param("shp")).total_bounds
 
-        catalog = pystac_client.Client.open(
-            self.base_url,
-            modifier=pc.sign_inplace,
-        )
+        if self._index is not None and _index_covers(
+            self._index_extent,
+            bounds_4326,
+            self.param("collection"),
+            self.param("start_date"),
+            self.param("end_date"),
+            self.param("filter"),
+        ):
+            items = self._search_index(bounds_4326)
+        else:
+            if self._index is not None:
+                warnings.warn(
+                    "The search is not covered by the harvested index (region, dates, "
+                    "collection or filter operators), searching the STAC API instead."
+                )
+            catalog = pystac_client.Client.open(
+                self.base_url,
+                modifier=pc.sign_inplace,
+            )
 
-        start_date = self.param("start_date")
-        end_date = self.param("end_date")
+            start_date = self.param("start_date")
+            end_date = self.param("end_date")
+            datetime = f"{start_date}/{end_date}" if start_date and end_date else None
+            search = catalog.search(
+                collections=self.param("collection"),
+                bbox=bounds_4326,
+                datetime=datetime,
+                query=self.param("filter"),
+            )
+            items = search.item_collection()
+
+        if len(items) == 0:
+            raise ValueError("No items found")
+        return items
+
+    def harvest(
+        self,
+        shp: gpd.GeoDataFrame,
+        collection: str,
+        start_date: str = None,
+        end_date: str = None,
+        filter: dict = None,
+        index_file: str = "./eo_index.parquet",
+    ):
+        """Retrieve the item metadata of a collection over a region once and store it as GeoParquet.
+        The stored index is loaded afterwards, so that search runs against it offline."""
+        bounds_4326 = self._reproject_shp(shp).total_bounds
+        # the hrefs are stored unsigned since the tokens expire, items are signed on search
+        catalog = pystac_client.Client.open(self.base_url)
         datetime = f"{start_date}/{end_date}" if start_date and end_date else None
         search = catalog.search(
-            collections=self.param("collection"),
+            collections=collection,
             bbox=bounds_4326,
             datetime=datetime,
-            query=self.param("filter"),
+            query=filter,
         )
 
-        items = search.item_collection()
-        if len(items) == 0:
+        records = [
+            {
+                "id": item.id,
+                "collection": item.collection_id,
+                "datetime": item.datetime
+                or pd.to_datetime(item.properties["start_datetime"]),
+                "item": json.dumps(item.to_dict()),
+                "geometry": shape(item.geometry),
+            }
+            for item in search.items()
+        ]
+        if len(records) == 0:
             raise ValueError("No items found")
+        index = gpd.GeoDataFrame(records, geometry="geometry", crs="EPSG:4326")
+        index["datetime"] = pd.to_datetime(index["datetime"], utc=True)
+
+        # store the harvested extent with the index, so that search knows what it covers
+        extent = {
+            "bbox": [float(b) for b in bounds_4326],
+            "collections": [collection] if isinstance(collection, str) else collection,
+            "start_date": start_date if start_date and end_date else None,
+            "end_date": end_date if start_date and end_date else None,
+            "filter": filter,
+        }
+        table = _geopandas_to_arrow(index)
+        table = table.replace_schema_metadata(
+            {**table.schema.metadata, b"terragon": json.dumps(extent).encode()}
+        )
+        index_file = Path(index_file)
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, index_file)
+        self.load_index(index_file)
+        return self._index
+
+    def load_index(self, index_file):
+        """Load a harvested item index and build the spatial index over the footprints."""
+        metadata = pq.read_schema(index_file).metadata or {}
+        if b"terragon" not in metadata:
+            raise ValueError(f"{index_file} was not created with harvest.")
+        self._index_extent = json.loads(metadata[b"terragon"])
+        self._index = gpd.read_parquet(index_file)
+        # build the spatial index once instead of lazily on the first search
+        self._index.sindex
+
+    def _search_index(self, bounds_4326):
+        """Search the items in the local index with the stored parameters."""
+        index = self._index
+        index = index.iloc[index.sindex.query(box(*bounds_4326), predicate="intersects")]
+
+        collections = self.param("collection")
+        if isinstance(collections, str):
+            collections = [collections]
+        index = index[index["collection"].isin(collections)]
+
+        start_date = self.param("start_date")
+        end_date = self.param("end_date")
+        if start_date and end_date:
+            start, end = _date_range(start_date, end_date)
+            index = index[(index["datetime"] >= start) & (index["datetime"] <= end)]
+
+        items = [pystac.Item.from_dict(json.loads(item)) for item in index["item"]]
+        filter = self.param("filter")
+        if filter:
+            items = [item for item in items if _match_query(item, filter)]
+        items = pystac.ItemCollection(items)
+        pc.sign_inplace(items)
         return items
 
     def download(self, items=None, create_minicube=True):
@@ -67,17 +194,20 @@ class PC(Base):
 
         shp = self.param("shp")
         bounds = list(shp.bounds.values[0])
-        res = meters_to_crs_unit(self.param("resolution"), shp)
+        # the grid of the cube, shared by the cloud mask and the bands
+        load_kwargs = dict(
+            crs=shp.crs,
+            resolution=meters_to_crs_unit(self.param("resolution"), shp),
+            x=(bounds[0], bounds[2]),
+            y=(bounds[1], bounds[3]),
+        )
+
+        if self.param("min_usable_fraction") is not None:
+            items = self._filter_usable(items, load_kwargs)
+            assert len(items) > 0, "No images with enough usable pixels to download."
 
         if create_minicube:
-            ds = odc.stac.load(
-                items,
-                bands=self.param("bands"),
-                crs=shp.crs,
-                resolution=res,
-                x=(bounds[0], bounds[2]),
-                y=(bounds[1], bounds[3]),
-            )
+            ds = odc.stac.load(items, bands=self.param("bands"), **load_kwargs)
             ds = self.prepare_cube(ds)
             return ds
         else:
@@ -97,3 +227,111 @@ class PC(Base):
                 delayed(self.download_file)(url, fn) for url, fn in zip(urls, fns)
             )
             return fns
+
+    def _filter_usable(self, items, load_kwargs):
+        """Read only the cloud mask over the shape and keep the items of the time steps
+        with enough usable pixels. Items are grouped by time as in the cube, so that
+        adjacent tiles of the same acquisition are evaluated together."""
+        collections = self.param("collection")
+        if isinstance(collections, str):
+            collections = [collections]
+        masks = [self._cloud_masks.get(c) for c in collections]
+        if None in masks or any(m != masks[0] for m in masks):
+            raise ValueError(
+                f"No common cloud mask available for collection {self.param('collection')}. "
+                f"Supported are: {list(self._cloud_masks)}."
+            )
+        band, classes = self._cloud_masks[collections[0]]
+        shp = self.param("shp")
+
+        mask = odc.stac.load(items, bands=[band], **load_kwargs)[band]
+        inside = geometry_mask(
+            shp.geometry,
+            out_shape=mask.shape[1:],
+            transform=mask.rio.transform(),
+            invert=True,
+        )
+        if not inside.any():
+            # the shape contains no pixel center, use all pixels it touches
+            inside = geometry_mask(
+                shp.geometry,
+                out_shape=mask.shape[1:],
+                transform=mask.rio.transform(),
+                all_touched=True,
+                invert=True,
+            )
+        if not inside.any():
+            raise ValueError("The shape does not cover any pixel of the cloud mask.")
+        usable = mask.isin(classes).values & inside
+        fractions = usable.sum(axis=(1, 2)) / inside.sum()
+
+        min_fraction = self.param("min_usable_fraction")
+        usable_times = pd.DatetimeIndex(mask.time.values[fractions >= min_fraction])
+        # the time steps are the naive utc timestamps of the items
+        return pystac.ItemCollection(
+            [
+                item
+                for item in items
+                if pd.Timestamp(item.datetime).tz_localize(None) in usable_times
+            ]
+        )
+
+
+def _index_covers(extent, bounds_4326, collections, start_date, end_date, query):
+    """Check if a search is fully covered by the harvested extent of an index."""
+    if not box(*extent["bbox"]).covers(box(*bounds_4326)):
+        return False
+
+    if isinstance(collections, str):
+        collections = [collections]
+    if not set(collections).issubset(extent["collections"]):
+        return False
+
+    # an index harvested with a filter only covers searches with the same filter
+    if extent["filter"] and extent["filter"] != query:
+        return False
+    if query and not all(
+        op in _QUERY_OPS for conditions in query.values() for op in conditions
+    ):
+        return False
+
+    if extent["start_date"]:
+        if not (start_date and end_date):
+            return False
+        start, end = _date_range(start_date, end_date)
+        index_start, index_end = _date_range(extent["start_date"], extent["end_date"])
+        if start < index_start or end > index_end:
+            return False
+    return True
+
+
+def _date_range(start_date, end_date):
+    """Convert the dates to an inclusive range of utc timestamps."""
+    start = pd.to_datetime(start_date, utc=True)
+    end = pd.to_datetime(end_date, utc=True)
+    if end == end.normalize():  # dates without time include the whole day
+        end += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return start, end
+
+
+_QUERY_OPS = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda value, options: value in options,
+}
+
+
+def _match_query(item, query):
+    """Evaluate a STAC query filter, e.g. {"eo:cloud_cover": {"lt": 10}}, on an item."""
+    for prop, conditions in query.items():
+        value = item.properties.get(prop)
+        if value is None:
+            return False
+        for op, expected in conditions.items():
+            if not _QUERY_OPS[op](value, expected):
+                return False
+    return True
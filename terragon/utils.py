@@ -1,4 +1,8 @@
+import math
+
+import numpy as np
 import pyproj
+from rasterio.transform import from_origin
 from shapely.geometry import Point
 
 
@@ -45,3 +49,49 @@ def meters_to_crs_unit(meters, shp):
     distance_units = Point(orig_point).distance(Point(offset_point_in_orig_crs))
 
     return distance_units
+
+
+def shp_to_grid(shp, resolution):
+    """Compute the target grid (transform and shape) of the shape in its CRS.
+
+    The resolution is given in meters and the bounds are snapped to multiples of it."""
+    res = meters_to_crs_unit(resolution, shp)
+    minx, miny, maxx, maxy = shp.total_bounds
+    minx, miny = math.floor(minx / res) * res, math.floor(miny / res) * res
+    maxx, maxy = math.ceil(maxx / res) * res, math.ceil(maxy / res) * res
+    width = max(int(round((maxx - minx) / res)), 1)
+    height = max(int(round((maxy - miny) / res)), 1)
+    transform = from_origin(minx, maxy, res, res)
+    return transform, (height, width)
+
+
+def grid_coords(transform, shape):
+    """Return the x and y coordinates of the pixel centers of a grid."""
+    height, width = shape
+    x = transform.c + (np.arange(width) + 0.5) * transform.a
+    y = transform.f + (np.arange(height) + 0.5) * transform.e
+    return x, y
+
+
+def grid_warp_index(src_crs, src_transform, src_shape, dst_crs, dst_transform, dst_shape):
+    """Nearest neighbour lookup of every target pixel in the source grid.
+
+    Returns the source rows and columns for each target pixel and a mask of the
+    target pixels which are covered by the source grid."""
+    rows, cols = np.indices(dst_shape)
+    xs, ys = dst_transform * (cols + 0.5, rows + 0.5)
+    if pyproj.CRS.from_user_input(src_crs) != pyproj.CRS.from_user_input(dst_crs):
+        transformer = pyproj.Transformer.from_crs(dst_crs, src_crs, always_xy=True)
+        xs, ys = transformer.transform(xs, ys)
+    src_cols, src_rows = ~src_transform * (xs, ys)
+    src_rows = np.floor(src_rows).astype(int)
+    src_cols = np.floor(src_cols).astype(int)
+    valid = (
+        (src_rows >= 0)
+        & (src_rows < src_shape[0])
+        & (src_cols >= 0)
+        & (src_cols < src_shape[1])
+    )
+    src_rows = np.clip(src_rows, 0, src_shape[0] - 1)
+    src_cols = np.clip(src_cols, 0, src_shape[1] - 1)
+    return src_rows, src_cols, valid
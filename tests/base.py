@@ -1,6 +1,10 @@
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import xarray as xr
+from rasterio.features import geometry_mask
 
 
 class _TestBase:
@@ -80,6 +84,52 @@ class _TestBase:
             and len(ds.y) == height
         )
 
+    def test_min_usable_fraction(self):
+        args = self.arguments.copy()
+        args["min_usable_fraction"] = 0.0
+        ds = self.tg.create(**args)
+        self.assertTrue(len(ds.time) == self.nr_time_steps)
+        # no scene can have more than all pixels usable
+        args["min_usable_fraction"] = 1.01
+        self.assertRaises(AssertionError, self.tg.create, **args)
+
+        # a threshold between the scene fractions keeps only the scenes above it
+        args = self.arguments.copy()
+        args["end_date"] = "2021-01-31"
+        fractions = self.usable_fractions(args)
+        values = np.sort(np.unique(fractions))
+        if len(values) < 2:
+            self.skipTest("All scenes have the same usable fraction.")
+        # threshold in the largest gap, robust to small differences in resampling
+        gap = np.argmax(np.diff(values))
+        args["min_usable_fraction"] = (values[gap] + values[gap + 1]) / 2
+        ds = self.tg.create(**args)
+        kept = set(fractions.index[fractions >= args["min_usable_fraction"]])
+        times = set(pd.DatetimeIndex(ds.time.values))
+        self.assertTrue(0 < len(times) < len(fractions))
+        self.assertEqual(times, kept)
+
+    def usable_fractions(self, args):
+        """usable fraction of the cloud mask within the shape per time step,
+        computed from the downloaded cloud mask band"""
+        band, classes = self.tg._cloud_masks[args["collection"]]
+        args = args.copy()
+        args["bands"] = [band]
+        mask = self.tg.create(**args)[band]
+        inside = geometry_mask(
+            args["shp"].geometry,
+            out_shape=mask.shape[1:],
+            transform=mask.rio.transform(),
+            invert=True,
+        )
+        usable = mask.isin(classes) & xr.DataArray(inside, dims=("y", "x"))
+        # images of the same time step are mosaicked
+        usable = usable.groupby("time").max()
+        return pd.Series(
+            usable.sum(("y", "x")).values / inside.sum(),
+            index=pd.DatetimeIndex(usable.time.values),
+        )
+
     def test_fail_on_missing_params(self):
         for arg in ["shp", "collection"]:
             args = self.arguments.copy()
@@ -0,0 +1,64 @@
+import shutil
+import unittest
+from pathlib import Path
+
+import geopandas as gpd
+
+from terragon.batch import _store_size, read_ledger, run_batch
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.output = Path("tests/download/batch/")
+        self.manifest = dict(
+            api="pc",
+            polygons="demo_files/data/TUM_OTN.geojson",
+            parameters=dict(
+                collection="sentinel-2-l2a",
+                bands=["B02", "B03", "B04"],
+                start_date="2021-01-01",
+                end_date="2021-01-05",
+                resolution=10,
+            ),
+            output=str(self.output),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.output, ignore_errors=True)
+
+    def test_batch(self):
+        done = run_batch(self.manifest, workers=1)
+        self.assertEqual(done, {"0"})
+        self.assertTrue(self.output.joinpath("0.nc").exists())
+        self.assertEqual(read_ledger(self.output.joinpath("ledger.jsonl")), {"0"})
+
+    def test_resume(self):
+        run_batch(self.manifest, workers=1)
+        self.output.joinpath("0.nc").unlink()
+        # the completed cube is skipped
+        run_batch(self.manifest, workers=1)
+        self.assertFalse(self.output.joinpath("0.nc").exists())
+
+    def test_duplicate_ids(self):
+        gdf = gpd.read_file(self.manifest["polygons"])
+        gdf = gpd.GeoDataFrame(
+            {"id": ["a", "a"]}, geometry=[gdf.geometry[0]] * 2, crs=gdf.crs
+        )
+        self.output.mkdir(parents=True, exist_ok=True)
+        gdf.to_file(self.output.joinpath("polygons.geojson"))
+        self.manifest["polygons"] = str(self.output.joinpath("polygons.geojson"))
+        self.manifest["id_column"] = "id"
+        self.assertRaises(ValueError, run_batch, self.manifest)
+
+    def test_store_size(self):
+        """the size of a store directory is the size of all files within"""
+        store = self.output.joinpath("cube.zarr")
+        store.joinpath("B02").mkdir(parents=True)
+        store.joinpath(".zattrs").write_bytes(b"0" * 10)
+        store.joinpath("B02", "0.0.0").write_bytes(b"0" * 100)
+        self.assertEqual(_store_size(store), 110)
+        self.assertEqual(_store_size(store.joinpath(".zattrs")), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+import geopandas as gpd
+import numpy as np
+import pyproj
+from rasterio.transform import from_origin
+from shapely.geometry import box
+
+from terragon.utils import grid_coords, grid_warp_index, shp_to_grid
+
+
+class TestGrid(unittest.TestCase):
+    def setUp(self):
+        self.gdf = gpd.GeoDataFrame(
+            geometry=[box(697603, 5326007, 697695, 5326041)], crs="EPSG:32632"
+        )
+        self.crs = pyproj.CRS.from_epsg(32632)
+
+    def test_shp_to_grid(self):
+        """the bounds are snapped to multiples of the resolution"""
+        transform, shape = shp_to_grid(self.gdf, 10)
+        self.assertEqual(shape, (5, 10))
+        self.assertAlmostEqual(transform.a, 10, places=6)
+        self.assertAlmostEqual(transform.e, -10, places=6)
+        self.assertAlmostEqual(transform.c, 697600, places=3)
+        self.assertAlmostEqual(transform.f, 5326050, places=3)
+
+        x, y = grid_coords(transform, shape)
+        np.testing.assert_allclose(x, 697605 + 10 * np.arange(10))
+        np.testing.assert_allclose(y, 5326045 - 10 * np.arange(5))
+
+    def test_warp_index_identity(self):
+        transform = from_origin(697600, 5326050, 10, 10)
+        rows, cols, valid = grid_warp_index(
+            self.crs, transform, (5, 10), self.crs, transform, (5, 10)
+        )
+        expected_rows, expected_cols = np.indices((5, 10))
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(cols, expected_cols)
+        self.assertTrue(valid.all())
+
+    def test_warp_index_shifted(self):
+        """source grid shifted by 1.2 pixels to the right and 1 pixel down"""
+        dst_transform = from_origin(697600, 5326050, 10, 10)
+        src_transform = from_origin(697612, 5326040, 10, 10)
+        rows, cols, valid = grid_warp_index(
+            self.crs, src_transform, (5, 10), self.crs, dst_transform, (5, 10)
+        )
+        # target pixel centers x=697605+10*j are at source column j-0.7,
+        # y=5326045-10*i at source row i-0.5
+        self.assertFalse(valid[0].any())
+        self.assertFalse(valid[:, 0].any())
+        self.assertTrue(valid[1:, 1:].all())
+        np.testing.assert_array_equal(rows[1:, 1:], np.indices((4, 9))[0])
+        np.testing.assert_array_equal(cols[1:, 1:], np.indices((4, 9))[1])
+
+    def test_warp_index_reprojected(self):
+        """a source grid in WGS84 is looked up at the reprojected pixel centers"""
+        dst_transform, dst_shape = shp_to_grid(self.gdf, 10)
+        bounds = self.gdf.to_crs("EPSG:4326").total_bounds
+        res = 0.0001
+        src_transform = from_origin(bounds[0] - res, bounds[3] + res, res, res)
+        src_shape = (
+            int((bounds[3] - bounds[1]) / res) + 3,
+            int((bounds[2] - bounds[0]) / res) + 3,
+        )
+        rows, cols, valid = grid_warp_index(
+            "EPSG:4326", src_transform, src_shape, self.crs, dst_transform, dst_shape
+        )
+        xs, ys = grid_coords(dst_transform, dst_shape)
+        xs, ys = np.meshgrid(xs, ys)
+        lon, lat = pyproj.Transformer.from_crs(
+            self.crs, "EPSG:4326", always_xy=True
+        ).transform(xs, ys)
+        np.testing.assert_array_equal(
+            cols[valid], np.floor((lon[valid] - src_transform.c) / res).astype(int)
+        )
+        np.testing.assert_array_equal(
+            rows[valid], np.floor((src_transform.f - lat[valid]) / res).astype(int)
+        )
+        # the polygon itself is covered by the source grid
+        self.assertTrue(valid[1:-1, 1:-1].all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import datetime
+import unittest
+
+import pandas as pd
+import pystac
+from shapely.geometry import box, mapping
+
+from terragon.microsoft_planetary_computer import (
+    _date_range,
+    _index_covers,
+    _match_query,
+)
+
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        self.extent = dict(
+            bbox=[11.0, 48.0, 12.0, 49.0],
+            collections=["sentinel-2-l2a"],
+            start_date="2021-01-01",
+            end_date="2021-01-31",
+            filter=None,
+        )
+        self.search = dict(
+            bounds_4326=[11.5, 48.5, 11.6, 48.6],
+            collections="sentinel-2-l2a",
+            start_date="2021-01-05",
+            end_date="2021-01-31",
+            query=None,
+        )
+
+    def covers(self, **kwargs):
+        return _index_covers(self.extent, **{**self.search, **kwargs})
+
+    def test_date_range(self):
+        """dates without time include the whole end day"""
+        start, end = _date_range("2021-01-01", "2021-01-31")
+        self.assertEqual(start, pd.Timestamp("2021-01-01", tz="UTC"))
+        self.assertEqual(end, pd.Timestamp("2021-01-31 23:59:59.999999", tz="UTC"))
+        _, end = _date_range("2021-01-01", "2021-01-31T12:00:00Z")
+        self.assertEqual(end, pd.Timestamp("2021-01-31 12:00", tz="UTC"))
+
+    def test_covers(self):
+        self.assertTrue(self.covers())
+        self.assertTrue(self.covers(collections=["sentinel-2-l2a"]))
+
+    def test_bbox(self):
+        self.assertTrue(self.covers(bounds_4326=[11.0, 48.0, 12.0, 49.0]))
+        self.assertFalse(self.covers(bounds_4326=[11.9, 48.5, 12.1, 48.6]))
+
+    def test_dates(self):
+        self.assertFalse(self.covers(end_date="2021-02-01"))
+        self.assertFalse(self.covers(start_date="2020-12-31"))
+        self.assertFalse(self.covers(start_date=None, end_date=None))
+        # an index without dates covers all dates
+        self.extent.update(start_date=None, end_date=None)
+        self.assertTrue(self.covers(start_date=None, end_date=None))
+
+    def test_collection(self):
+        self.assertFalse(self.covers(collections="landsat-c2-l2"))
+        self.assertFalse(self.covers(collections=["sentinel-2-l2a", "landsat-c2-l2"]))
+
+    def test_harvested_filter(self):
+        query = {"eo:cloud_cover": {"lt": 10}}
+        self.extent["filter"] = query
+        self.assertTrue(self.covers(query=query))
+        self.assertFalse(self.covers(query=None))
+        self.assertFalse(self.covers(query={"eo:cloud_cover": {"lt": 20}}))
+
+    def test_operators(self):
+        self.assertTrue(self.covers(query={"eo:cloud_cover": {"lt": 10, "gte": 0}}))
+        self.assertFalse(self.covers(query={"s2:mgrs_tile": {"startsWith": "32U"}}))
+
+    def test_match_query(self):
+        geom = box(11.0, 48.0, 12.0, 49.0)
+        item = pystac.Item(
+            "item",
+            mapping(geom),
+            list(geom.bounds),
+            datetime.datetime(2021, 1, 1),
+            {"eo:cloud_cover": 5, "platform": "sentinel-2a"},
+        )
+        self.assertTrue(_match_query(item, {"eo:cloud_cover": {"lt": 10, "gte": 5}}))
+        self.assertFalse(_match_query(item, {"eo:cloud_cover": {"gt": 5}}))
+        self.assertTrue(
+            _match_query(item, {"platform": {"in": ["sentinel-2a", "sentinel-2b"]}})
+        )
+        self.assertFalse(_match_query(item, {"platform": {"neq": "sentinel-2a"}}))
+        # missing properties do not match
+        self.assertFalse(_match_query(item, {"s2:mgrs_tile": {"eq": "32UPU"}}))
+
+
+if __name__ == "__main__":
+    unittest.main()
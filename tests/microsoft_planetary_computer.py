@@ -1,4 +1,5 @@
 import unittest
+from pathlib import Path
 
 from base import _TestBase
 
@@ -12,6 +13,30 @@ class TestPC(_TestBase, unittest.TestCase):
         self.arguments["collection"] = "sentinel-2-l2a"
         self.arguments["bands"] = ["B02", "B03", "B04"]
 
+    def test_index(self):
+        items = self.tg.search(**self.arguments)
+        index_file = Path(self.arguments["download_folder"]).joinpath("index.parquet")
+        self.tg.harvest(
+            shp=self.gdf,
+            collection=self.arguments["collection"],
+            start_date=self.arguments["start_date"],
+            end_date=self.arguments["end_date"],
+            index_file=index_file,
+        )
+        self.assertTrue(index_file.exists())
+        index_items = self.tg.search(**self.arguments)
+        self.assertEqual(
+            sorted(item.id for item in items), sorted(item.id for item in index_items)
+        )
+
+        # dates outside of the harvested range fall back to the STAC API
+        args = self.arguments.copy()
+        args["end_date"] = "2021-01-10"
+        with self.assertWarns(UserWarning):
+            fallback_items = self.tg.search(**args)
+        self.assertTrue(len(fallback_items) >= len(items))
+        index_file.unlink()
+
 
 if __name__ == "__main__":
     unittest.main()